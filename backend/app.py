@@ -2,16 +2,28 @@ import asyncio
 import hashlib
 import os
 import sqlite3
-import json
-from typing import List, Dict, Any, Optional
+import threading
+import time
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import lru_cache, partial
 from pathlib import Path
+from uuid import uuid4
 
 import fitz 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+import httpx
+import numpy as np
+import orjson
+from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, ORJSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from cachetools import TTLCache
 from loguru import logger
 from pydantic import BaseModel
 from tiktoken import get_encoding
@@ -25,8 +37,16 @@ from langchain.schema import HumanMessage, SystemMessage
 # Add Groq import
 from groq import Groq
 
+# Kept out of this module so spawned extraction workers don't import the app
+try:
+    from extraction import count_pages, extract_page_range
+except ModuleNotFoundError as e:  # imported as backend.app from the repository root
+    if e.name != "extraction":
+        raise
+    from backend.extraction import count_pages, extract_page_range
+
 # Add local embeddings
-from transformers import AutoModel
+from transformers import AutoModel, AutoTokenizer
 import torch
 
 # Configure logger for pretty output
@@ -45,18 +65,50 @@ except Exception as e:
 # Environment / API Keys
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Model settings shared by every Groq call
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_TEMPERATURE = 0.1
+
+# Optional Redis for the arq analysis worker (see worker.py)
+REDIS_URL = os.getenv("REDIS_URL")
+
 # Create uploads directory
 UPLOADS_DIR = Path("uploads")
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Data derived from uploads; kept outside UPLOADS_DIR, which is served publicly at /uploads
+EXTRACTED_DIR = Path("extracted")
+EXTRACTED_DIR.mkdir(exist_ok=True)
+
+# Uploads are read and hashed in pieces of this size
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
 # Log environment variable status
 logger.info(f"🔑 GROQ_API_KEY: {'✅ Set' if GROQ_API_KEY else '❌ Not set'}")
+logger.info(f"🧵 REDIS_URL: {'✅ Set (arq worker)' if REDIS_URL else '❌ Not set (in-process background tasks)'}")
 
 # ---------- Database Schema ----------
 
+DB_PATH = 'insurance_analysis.db'
+
+# Applied to every new connection (journal_mode=WAL is persisted in the file)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64 MiB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+    "PRAGMA busy_timeout=5000",
+)
+
+def _configure_connection(db: sqlite3.Connection):
+    """Apply performance PRAGMAs to a new connection"""
+    for pragma in SQLITE_PRAGMAS:
+        db.execute(pragma)
+
 def init_database():
     """Initialize database with schema"""
-    db = sqlite3.connect('insurance_analysis.db')
+    db = get_db()
     
     # Documents table
     db.execute('''
@@ -88,6 +140,11 @@ def init_database():
         )
     ''')
     
+    # Lookups and summary dedup of a document's findings
+    db.execute('CREATE INDEX IF NOT EXISTS idx_findings_doc ON findings (document_id, summary)')
+    # Category filter on a document's findings
+    db.execute('CREATE INDEX IF NOT EXISTS idx_findings_doc_category ON findings (document_id, category)')
+    
     # Cache table 
     db.execute('''
         CREATE TABLE IF NOT EXISTS cache (
@@ -98,16 +155,53 @@ def init_database():
     ''')
     
     db.commit()
-    db.close()
+    
+    # Refresh planner statistics so lookups use the rowid / primary key indexes
+    db.execute('ANALYZE')
     logger.info("✅ Database initialized with enhanced schema")
 
+# One persistent connection per thread: the event loop thread and each executor
+# thread open and configure their connection once, then reuse it
+_db_local = threading.local()
+
+def get_db() -> sqlite3.Connection:
+    """Get this thread's pooled SQLite connection (do not close it)"""
+    db = getattr(_db_local, "db", None)
+    if db is None:
+        db = sqlite3.connect(DB_PATH)
+        _configure_connection(db)
+        _db_local.db = db
+    return db
+
+# Request-path reads run on these threads, each with its own pooled connection,
+# so SQLite I/O doesn't block the event loop
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sqlite")
+
+def _fetchone(sql: str, params: tuple) -> Optional[tuple]:
+    return get_db().execute(sql, params).fetchone()
+
+def _fetchall(sql: str, params: tuple) -> List[tuple]:
+    return get_db().execute(sql, params).fetchall()
+
+async def db_fetchone(sql: str, params: tuple = ()) -> Optional[tuple]:
+    """Run a single-row query on a pooled connection off the event loop"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, _fetchone, sql, params)
+
+async def db_fetchall(sql: str, params: tuple = ()) -> List[tuple]:
+    """Run a query on a pooled connection off the event loop"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, _fetchall, sql, params)
+
+# Upsert in place rather than INSERT OR REPLACE (which deletes and re-inserts the row)
+CACHE_UPSERT_SQL = '''
+    INSERT INTO cache (key, value) VALUES (?, ?)
+    ON CONFLICT(key) DO UPDATE SET value = excluded.value
+'''
+
 # Initialize database on startup
 init_database()
 
-def get_db():
-    """Get SQLite database connection"""
-    return sqlite3.connect('insurance_analysis.db')
-
 # ---------- Concern Detection Categories ----------
 
 CONCERN_CATEGORIES = {
@@ -125,53 +219,60 @@ CONCERN_CATEGORIES = {
 
 # ---------- Enhanced Text Extraction with Coordinates ----------
 
-async def extract_text_with_coordinates(bytes_: bytes) -> List[Dict[str, Any]]:
+# Each extraction worker gets at least this many pages; smaller documents are
+# extracted in a thread, since starting a worker costs more than a few pages
+EXTRACT_PAGES_PER_WORKER = 16
+
+def _available_cpus() -> int:
+    """CPUs this process may run on (respects container/affinity limits, unlike os.cpu_count())"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS/Windows
+        return os.cpu_count() or 1
+
+EXTRACT_MAX_WORKERS = min(4, _available_cpus())
+
+# Spawned (not forked) workers so children don't inherit torch/executor threads.
+# Processes are only started on first submit.
+EXTRACT_POOL = ProcessPoolExecutor(
+    max_workers=EXTRACT_MAX_WORKERS,
+    mp_context=multiprocessing.get_context("spawn")
+)
+
+async def extract_text_with_coordinates(pdf_path: Path) -> List[Dict[str, Any]]:
     """
     Extract text with page numbers and coordinates for highlighting
     """
-    logger.info(f"📄 Extracting text with coordinates from {len(bytes_)} bytes...")
+    logger.info(f"📄 Extracting text with coordinates from {pdf_path.name}...")
     
     loop = asyncio.get_event_loop()
-    text_blocks = await loop.run_in_executor(None, _sync_extract_with_coordinates, bytes_)
+    page_count = await loop.run_in_executor(None, count_pages, pdf_path)
     
-    logger.info(f"📄 Extracted {len(text_blocks)} text blocks with coordinates")
-    return text_blocks
-
-def _sync_extract_with_coordinates(bytes_: bytes) -> List[Dict[str, Any]]:
-    """Synchronous text extraction with coordinates"""
-    doc = fitz.open(stream=bytes_, filetype="pdf")
-    text_blocks = []
-    
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        
-        # Get text blocks with coordinates
-        blocks = page.get_text("dict")
-        
-        for block in blocks.get("blocks", []):
-            if "lines" in block:  # Text block
-                for line in block["lines"]:
-                    for span in line["spans"]:
-                        if span["text"].strip():  # Non-empty text
-                            text_blocks.append({
-                                "text": span["text"].strip(),
-                                "page_num": page_num + 1,  # 1-indexed
-                                "coordinates": [
-                                    span["bbox"][0],  # x0
-                                    span["bbox"][1],  # y0
-                                    span["bbox"][2],  # x1
-                                    span["bbox"][3]   # y1
-                                ],
-                                "font_size": span["size"],
-                                "font_name": span["font"],
-                                "block_id": f"page_{page_num + 1}_block_{len(text_blocks)}"
-                            })
+    workers = min(EXTRACT_MAX_WORKERS, page_count // EXTRACT_PAGES_PER_WORKER)
+    if workers < 2:
+        text_blocks = await loop.run_in_executor(None, extract_page_range, pdf_path, 0, page_count)
+    else:
+        # One contiguous page range per worker, flattened back in page order.
+        # Workers open the file themselves, so only the path is pickled.
+        step = -(-page_count // workers)
+        parts = await asyncio.gather(*[
+            loop.run_in_executor(EXTRACT_POOL, extract_page_range, pdf_path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ])
+        text_blocks = [block for part in parts for block in part]
+        logger.debug(f"📄 Extracted {page_count} pages across {len(parts)} worker processes")
     
-    doc.close()
+    logger.info(f"📄 Extracted {len(text_blocks)} text blocks with coordinates")
     return text_blocks
 
 # ---------- Enhanced Chunking with Location Awareness ----------
 
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    """Get the cl100k_base tokenizer, loaded lazily once per process"""
+    # tiktoken downloads the BPE file on first use, so don't load at import time
+    return get_encoding("cl100k_base")
+
 async def chunk_text_with_coordinates(text_blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Create semantic chunks while preserving location information
@@ -185,42 +286,49 @@ async def chunk_text_with_coordinates(text_blocks: List[Dict[str, Any]]) -> List
         "page_num": None,
         "coordinates": [],
         "block_ids": [],
+        "token_ids": [],
         "token_count": 0
     }
     
-    enc = get_encoding("cl100k_base")
+    enc = get_tokenizer()
     CHUNK_SIZE = 200
     CHUNK_OVERLAP = 100
     
-    for block in text_blocks:
-        block_tokens = enc.encode(block["text"])
-        
-        # Check if adding this block would exceed chunk size
-        if current_chunk["token_count"] + len(block_tokens) > CHUNK_SIZE and current_chunk["text"]:
+    # Encode every block in one call - tiktoken parallelizes the batch in Rust
+    block_tokens = enc.encode_batch([b["text"] for b in text_blocks], num_threads=_available_cpus())
+    separator_ids = enc.encode(" ")
+    
+    for block, tokens in zip(text_blocks, block_tokens):
+        # Check if adding this block would exceed chunk size (block_ids is empty
+        # while the chunk holds only overlap, which is never saved on its own)
+        if current_chunk["token_count"] + len(tokens) > CHUNK_SIZE and current_chunk["block_ids"]:
             # Save current chunk
             if len(current_chunk["text"].strip()) > 50:
                 chunks.append(current_chunk.copy())
             
-            # Start new chunk with overlap
-            overlap_text = current_chunk["text"][-100:]  # Simple overlap
+            # Start new chunk with the last CHUNK_OVERLAP tokens as overlap
+            overlap_ids = current_chunk["token_ids"][-CHUNK_OVERLAP:]
             current_chunk = {
-                "text": overlap_text,
+                "text": enc.decode(overlap_ids),
                 "page_num": block["page_num"],
-                "coordinates": block["coordinates"],
-                "block_ids": [block["block_id"]],
-                "token_count": len(enc.encode(overlap_text))
+                "coordinates": [],
+                "block_ids": [],
+                "token_ids": overlap_ids,
+                "token_count": len(overlap_ids)
             }
         
         # Add block to current chunk
         if current_chunk["text"]:
             current_chunk["text"] += " " + block["text"]
+            current_chunk["token_ids"] += separator_ids
         else:
             current_chunk["text"] = block["text"]
             current_chunk["page_num"] = block["page_num"]
         
         current_chunk["coordinates"].append(block["coordinates"])
         current_chunk["block_ids"].append(block["block_id"])
-        current_chunk["token_count"] += len(block_tokens)
+        current_chunk["token_ids"] += tokens
+        current_chunk["token_count"] = len(current_chunk["token_ids"])
     
     # Add final chunk
     if current_chunk["text"] and len(current_chunk["text"].strip()) > 50:
@@ -229,6 +337,7 @@ async def chunk_text_with_coordinates(text_blocks: List[Dict[str, Any]]) -> List
     # Add unique IDs to chunks for serialization
     for i, chunk in enumerate(chunks):
         chunk["id"] = str(i)
+        chunk.pop("token_ids", None)  # Only needed while building overlaps
         # Ensure all required fields exist
         chunk.setdefault("text", "")
         chunk.setdefault("page_num", None)
@@ -274,35 +383,51 @@ TEXT TO ANALYZE:
 Respond with ONLY valid JSON, no other text.
 """
 
-async def analyze_chunk_for_concerns(llm: Groq, chunk: Dict[str, Any]) -> Dict[str, Any]:
+# Only text_content varies, so split the template once and concatenate per chunk
+_PROMPT_PRE, _PROMPT_POST = (
+    part.replace("{{", "{").replace("}}", "}") for part in ANALYST_PROMPT.split("{text_content}")
+)
+# Part of the analysis cache key so editing the prompt invalidates cached results
+_PROMPT_HASH = hashlib.sha1(ANALYST_PROMPT.encode()).hexdigest()[:12]
+
+# Max number of concurrent Groq requests during document analysis
+LLM_CONCURRENCY = 16
+_llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+# Blocking Groq calls get their own threads, so a running analysis can't fill the
+# default executor that chat, embeddings and PDF extraction queue on
+LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="groq")
+
+async def analyze_chunk_for_concerns(create_chat: Optional[Callable], chunk: Dict[str, Any],
+                                     cache_writes: Optional[List[tuple]] = None) -> Dict[str, Any]:
     """
     Analyze each text chunk for insurance concerns
+    
+    If cache_writes is given, new cache rows are appended to it for the caller
+    to flush in one transaction instead of being committed immediately.
     """
-    if not llm:
+    if not create_chat:
         return {"is_concern": False}
     
-    cache_key = f"analysis:{hashlib.sha1(chunk['text'].encode()).hexdigest()}"
+    cache_key = f"analysis:{_PROMPT_HASH}:{hashlib.sha1(chunk['text'].encode()).hexdigest()}"
     
     # Try cache first
-    db = get_db()
-    cursor = db.execute('SELECT value FROM cache WHERE key = ?', (cache_key,))
-    result = cursor.fetchone()
+    result = await db_fetchone('SELECT value FROM cache WHERE key = ? LIMIT 1', (cache_key,))
     if result:
-        db.close()
-        return json.loads(result[0])
-    
-    logger.info(f"🔍 [Analysis] Analyzing chunk for concerns...")
+        return orjson.loads(result[0])
     
     try:
-        prompt = ANALYST_PROMPT.format(text_content=chunk['text'])
+        prompt = _PROMPT_PRE + chunk['text'] + _PROMPT_POST
         messages = [{"role": "user", "content": prompt}]
         
-        response = llm.chat.completions.create(
-            messages=messages,
-            model="llama-3.3-70b-versatile",
-            temperature=0.1,
-            max_tokens=300
-        )
+        # Groq client is sync - run it off the event loop, capped at LLM_CONCURRENCY
+        async with _llm_semaphore:
+            logger.info(f"🔍 [Analysis] Analyzing chunk for concerns...")
+            loop = asyncio.get_event_loop()
+            response = await loop.run_in_executor(LLM_EXECUTOR, partial(
+                create_chat,
+                messages=messages,
+                max_tokens=300
+            ))
         
         result_text = response.choices[0].message.content.strip()
         
@@ -316,7 +441,7 @@ async def analyze_chunk_for_concerns(llm: Groq, chunk: Dict[str, Any]) -> Dict[s
         
         # Parse JSON response
         try:
-            analysis_result = json.loads(result_text)
+            analysis_result = orjson.loads(result_text)
             
             # Validate required fields
             if not isinstance(analysis_result, dict):
@@ -326,26 +451,32 @@ async def analyze_chunk_for_concerns(llm: Groq, chunk: Dict[str, Any]) -> Dict[s
                 analysis_result['is_concern'] = False
             
             # Cache the result
-            db.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', 
-                      (cache_key, json.dumps(analysis_result)))
-            db.commit()
-            db.close()
+            cache_row = (cache_key, orjson.dumps(analysis_result).decode())
+            if cache_writes is not None:
+                cache_writes.append(cache_row)
+            else:
+                db = get_db()
+                db.execute(CACHE_UPSERT_SQL, cache_row)
+                db.commit()
             
             logger.info(f"✅ [Analysis] Found concern: {analysis_result.get('category', 'None')}")
             return analysis_result
             
-        except (json.JSONDecodeError, ValueError) as e:
+        except (orjson.JSONDecodeError, ValueError) as e:
             logger.warning(f"⚠️ [Analysis] Invalid JSON response: {result_text}")
             logger.warning(f"⚠️ [Analysis] Error: {e}")
             return {"is_concern": False}
             
     except Exception as e:
         logger.error(f"❌ [Analysis] Error: {e}")
-        db.close()
         return {"is_concern": False}
 
 # ---------- Enhanced Database Operations ----------
 
+def get_blocks_path(document_id: str) -> Path:
+    """Path of a document's extracted text blocks (JSON)"""
+    return EXTRACTED_DIR / f"{document_id}.blocks.json"
+
 async def save_document_metadata(document_id: str, filename: str, total_pages: int):
     """Save document metadata"""
     db = get_db()
@@ -354,32 +485,34 @@ async def save_document_metadata(document_id: str, filename: str, total_pages: i
         VALUES (?, ?, ?, ?)
     ''', (document_id, filename, total_pages, 'pending'))
     db.commit()
-    db.close()
 
-async def save_finding(document_id: str, finding: Dict[str, Any], chunk: Dict[str, Any]):
-    """Save a finding to the database"""
-    db = get_db()
-    
+def build_finding_row(document_id: str, finding: Dict[str, Any], chunk: Dict[str, Any]) -> tuple:
+    """Build the findings table row for a finding"""
     # Calculate confidence score
     confidence = calculate_finding_confidence(finding, chunk)
     
-    db.execute('''
-        INSERT INTO findings 
-        (document_id, page_num, coordinates, text_content, category, severity, summary, recommendation, confidence_score)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+    return (
         document_id,
         chunk['page_num'],
-        json.dumps(chunk['coordinates']),
+        orjson.dumps(chunk['coordinates']).decode(),
         chunk['text'],
         finding['category'],
         finding['severity'],
         finding['summary'],
         finding.get('recommendation', ''),
         confidence
-    ))
-    db.commit()
-    db.close()
+    )
+
+def save_findings(db: sqlite3.Connection, rows: List[tuple]):
+    """Save finding rows using an open connection; the caller owns the transaction"""
+    db.executemany('''
+        INSERT INTO findings 
+        (document_id, page_num, coordinates, text_content, category, severity, summary, recommendation, confidence_score)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+# Already lowercase, matched against the lowercased chunk text
+LEGAL_TERMS = ('excluded', 'not covered', 'limitation', 'deductible', 'copayment', 'waiting period')
 
 def calculate_finding_confidence(finding: Dict[str, Any], chunk: Dict[str, Any]) -> float:
     """Calculate confidence score for a finding"""
@@ -390,8 +523,8 @@ def calculate_finding_confidence(finding: Dict[str, Any], chunk: Dict[str, Any])
         confidence += 0.1
     
     # Legal terms presence
-    legal_terms = ['excluded', 'not covered', 'limitation', 'deductible', 'copayment', 'waiting period']
-    term_count = sum(1 for term in legal_terms if term.lower() in chunk['text'].lower())
+    text_lower = chunk['text'].lower()
+    term_count = sum(1 for term in LEGAL_TERMS if term in text_lower)
     confidence += min(term_count * 0.1, 0.3)
     
     # Severity boost
@@ -416,7 +549,44 @@ async def update_analysis_status(document_id: str, status: str):
             WHERE id = ?
         ''', (status, document_id))
     db.commit()
-    db.close()
+    notify_progress(document_id)
+
+# Waiters for a document's next status change (long-poll / WebSocket progress).
+# Only wakes waiters in this process; status written by the arq worker is picked
+# up by re-reading every PROGRESS_REMOTE_POLL_INTERVAL seconds instead.
+progress_events: Dict[str, asyncio.Event] = {}
+# Number of open long-polls / WebSockets per document; the event is dropped with the last one
+progress_watchers: Dict[str, int] = {}
+
+def notify_progress(document_id: str):
+    """Wake everything waiting on this document's status"""
+    event = progress_events.pop(document_id, None)
+    if event:
+        event.set()
+
+@contextmanager
+def watching_progress(document_id: str):
+    """Keep this document's progress event registered while a client is waiting on it"""
+    progress_watchers[document_id] = progress_watchers.get(document_id, 0) + 1
+    try:
+        yield
+    finally:
+        progress_watchers[document_id] -= 1
+        if not progress_watchers[document_id]:
+            del progress_watchers[document_id]
+            progress_events.pop(document_id, None)
+
+def progress_event(document_id: str) -> asyncio.Event:
+    """Event set on the document's next status change (use inside watching_progress)"""
+    return progress_events.setdefault(document_id, asyncio.Event())
+
+async def wait_for_progress(event: asyncio.Event, timeout: float) -> bool:
+    """Wait for a progress event; False if it timed out"""
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
 
 # ---------- Background Analysis Task ----------
 
@@ -427,45 +597,31 @@ async def analyze_document_background(document_id: str):
     try:
         await update_analysis_status(document_id, 'analyzing')
         
-        # Get document text from cache
-        db = get_db()
-        cursor = db.execute('SELECT value FROM cache WHERE key = ?', (f"text:{document_id}",))
-        result = cursor.fetchone()
-        db.close()
-        
-        if not result:
-            logger.error(f"❌ [Background] Document text not found: {document_id}")
-            await update_analysis_status(document_id, 'failed')
-            return
-        
-        # Get text blocks from cache
-        text = result[0]
-        
-        # Get text blocks from cache
-        db = get_db()
-        cursor = db.execute('SELECT value FROM cache WHERE key = ?', (f"blocks:{document_id}",))
-        blocks_result = cursor.fetchone()
-        db.close()
-        
-        if not blocks_result:
+        # Get text blocks saved by /ingest
+        blocks_path = get_blocks_path(document_id)
+        if not blocks_path.exists():
             logger.error(f"❌ [Background] Document blocks not found: {document_id}")
             await update_analysis_status(document_id, 'failed')
             return
         
-        text_blocks = json.loads(blocks_result[0])
+        text_blocks = orjson.loads(blocks_path.read_bytes())
         chunks = await chunk_text_with_coordinates(text_blocks)
         
         # Get LLM
-        llm = get_llm()
-        if not llm:
+        create_chat = get_create_chat()
+        if not create_chat:
             logger.error(f"❌ [Background] LLM not available")
             await update_analysis_status(document_id, 'failed')
             return
         
-        # Analyze each chunk
-        findings_count = 0
-        for chunk in chunks:
-            finding = await analyze_chunk_for_concerns(llm, chunk)
+        # Analyze all chunks concurrently (bounded by LLM_CONCURRENCY)
+        cache_writes = []
+        results = await asyncio.gather(*[
+            analyze_chunk_for_concerns(create_chat, chunk, cache_writes) for chunk in chunks
+        ])
+        
+        finding_rows = []
+        for chunk, finding in zip(chunks, results):
             if finding.get('is_concern', False):
                 # Create a mock chunk with page info for now
                 mock_chunk = {
@@ -473,8 +629,14 @@ async def analyze_document_background(document_id: str):
                     'page_num': 1,  # Default page
                     'coordinates': [0, 0, 100, 100]  # Default coordinates
                 }
-                await save_finding(document_id, finding, mock_chunk)
-                findings_count += 1
+                finding_rows.append(build_finding_row(document_id, finding, mock_chunk))
+        findings_count = len(finding_rows)
+        
+        # Write cached analyses and findings in a single transaction
+        db = get_db()
+        with db:
+            db.executemany(CACHE_UPSERT_SQL, cache_writes)
+            save_findings(db, finding_rows)
         
         logger.info(f"✅ [Background] Analysis completed. Found {findings_count} concerns")
         await update_analysis_status(document_id, 'completed')
@@ -485,29 +647,83 @@ async def analyze_document_background(document_id: str):
 
 # ---------- Core Functions ----------
 
-def get_embeddings():
-    """Get embeddings using local Jina model"""
-    logger.info("🔗 Creating local embeddings with Jina model...")
-    try:
-        embedding_model = AutoModel.from_pretrained(
+EMBED_BATCH_SIZE = 32
+
+@lru_cache(maxsize=1)
+def _load_embedding_model():
+    """Load the Jina model once per process in reduced precision"""
+    if torch.cuda.is_available():
+        # fp16 on GPU
+        model = AutoModel.from_pretrained(
+            'jinaai/jina-embeddings-v2-base-en',
+            trust_remote_code=True,
+            torch_dtype=torch.float16
+        ).to("cuda")
+        logger.info("✅ Local embedding model loaded in fp16 on GPU")
+    else:
+        # Dynamic int8 quantization of the Linear layers on CPU
+        model = AutoModel.from_pretrained(
             'jinaai/jina-embeddings-v2-base-en',
             trust_remote_code=True
         )
-        logger.info("✅ Local embedding model loaded successfully")
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info("✅ Local embedding model loaded with int8 quantization on CPU")
+    return model.eval()
+
+# A failed model load (e.g. a hub/network blip) is retried after this long,
+# rather than on every call or never again
+MODEL_RETRY_SECONDS = 60
+
+# name -> loaded model / time of the last failed load. A lock per name serializes
+# loads so concurrent callers don't each load the same model.
+_loaded_models: Dict[str, Any] = {}
+_model_failed_at: Dict[str, float] = {}
+_model_locks: Dict[str, threading.Lock] = {}
+
+def _get_model(name: str, create: Callable[[], Any]) -> Any:
+    """Call create() until it returns a model, then keep it; None while in the retry cooldown"""
+    model = _loaded_models.get(name)
+    if model is not None:
+        return model
+    with _model_locks.setdefault(name, threading.Lock()):
+        model = _loaded_models.get(name)
+        if model is None:
+            failed_at = _model_failed_at.get(name)
+            if failed_at is not None and time.monotonic() - failed_at < MODEL_RETRY_SECONDS:
+                return None
+            model = create()
+            if model is None:
+                _model_failed_at[name] = time.monotonic()
+            else:
+                _loaded_models[name] = model
+                _model_failed_at.pop(name, None)
+        return model
+
+def get_embeddings():
+    """Get embeddings using local Jina model (blocks while the model loads on first use)"""
+    return _get_model("embeddings", _create_embeddings)
+
+def _create_embeddings():
+    logger.info("🔗 Creating local embeddings with Jina model...")
+    try:
+        embedding_model = _load_embedding_model()
         
         class LocalEmbeddings:
             def __init__(self, model):
                 self.model = model
             
             def embed_documents(self, texts):
-                embeddings = []
-                for text in texts:
-                    embedding = self.model.encode(text).tolist()
-                    embeddings.append(embedding)
-                return embeddings
+                texts = list(texts)
+                if not texts:
+                    return []
+                # One batched forward pass per EMBED_BATCH_SIZE texts
+                with torch.inference_mode():
+                    embeddings = self.model.encode(texts, batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True)
+                return embeddings.tolist()
             
             def embed_query(self, text):
-                return self.model.encode(text).tolist()
+                with torch.inference_mode():
+                    return self.model.encode(text).tolist()
         
         return LocalEmbeddings(embedding_model)
     except Exception as e:
@@ -527,47 +743,190 @@ def get_vectorstore(namespace: str):
     vectorstore = Chroma(
         collection_name=collection_name,
         embedding_function=embeddings,
-        persist_directory="./chroma_db"
+        persist_directory="./chroma_db",
+        # HNSW settings only take effect when the collection is first created
+        collection_metadata={"hnsw:construction_ef": 100}
     )
     
     return vectorstore
 
+@lru_cache(maxsize=1)
 def get_llm():
+    """Get the Groq client, created once per process so connections are reused"""
     if not GROQ_API_KEY:
         logger.error("❌ GROQ_API_KEY not set - cannot create LLM")
         return None
     logger.info("🤖 Creating LLM with Groq...")
     try:
-        groq_client = Groq(api_key=GROQ_API_KEY)
+        # One pooled HTTP client keeps TCP+TLS connections to Groq alive across requests
+        http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=64)
+        )
+        groq_client = Groq(api_key=GROQ_API_KEY, http_client=http_client)
         logger.info("✅ Groq client created successfully")
         return groq_client
     except Exception as e:
         logger.error(f"❌ Failed to create Groq client: {e}")
         return None
 
-async def compute_hash(bytes_: bytes) -> str:
-    h = hashlib.sha256(bytes_)
-    file_hash = h.hexdigest()
+@lru_cache(maxsize=1)
+def get_create_chat() -> Optional[Callable]:
+    """chat.completions.create on the shared client with model and temperature pinned"""
+    llm = get_llm()
+    if not llm:
+        return None
+    return partial(llm.chat.completions.create, model=LLM_MODEL, temperature=LLM_TEMPERATURE)
+
+async def save_upload(file: UploadFile) -> Tuple[Optional[str], Optional[Path], int]:
+    """Stream an upload to UPLOADS_DIR/{sha256}.pdf, hashing as it is written.
+    Returns (file_hash, pdf_path, size); an empty upload is not kept."""
+    # hashlib hashes through OpenSSL (SHA-NI where the CPU has it) and drops the GIL
+    h = hashlib.sha256()
+    size = 0
+    tmp_path = UPLOADS_DIR / f"tmp_{uuid4().hex}.pdf"
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                h.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        if not size:
+            tmp_path.unlink()
+            return None, None, 0
+        file_hash = h.hexdigest()
+        pdf_path = UPLOADS_DIR / f"{file_hash}.pdf"
+        if pdf_path.exists():
+            # Same bytes already stored; keep that file so its mtime (and ETag) stay stable
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, pdf_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
     logger.info(f"🔍 [Hash] {file_hash}")
-    return file_hash
+    return file_hash, pdf_path, size
 
-async def extract_text(bytes_: bytes) -> str:
-    logger.info(f"📄 Extracting text from {len(bytes_)} bytes...")
+async def extract_text(pdf_path: Path) -> str:
+    logger.info(f"📄 Extracting text from {pdf_path.name}...")
     loop = asyncio.get_event_loop()
-    text = await loop.run_in_executor(None, _sync_extract, bytes_)
+    text = await loop.run_in_executor(None, _sync_extract, pdf_path)
     logger.info(f"📄 Extracted {len(text)} characters of text")
     return text
 
-def _sync_extract(bytes_: bytes) -> str:
-    doc = fitz.open(stream=bytes_, filetype="pdf")
+def _sync_extract(pdf_path: Path) -> str:
+    doc = fitz.open(str(pdf_path))
     pages = [page.get_text() for page in doc]
     doc.close()
     logger.debug(f"📄 Processed {len(pages)} pages")
     return "\n".join(pages)
 
+# ---------- Contextual Chat Prompt ----------
+
+CHAT_SYSTEM_PROMPT = """
+You are an expert insurance consultant. Answer the user's question based on this specific finding.
+Provide a focused answer based only on this finding's context.
+
+FINDING DETAILS:
+- Category: {category}
+- Summary: {summary}
+- Text: {text_content}
+"""
+
+# Chat calls are interactive, so they don't queue behind analysis on LLM_EXECUTOR
+CHAT_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="groq-chat")
+
+# Focused answers need ~80-150 tokens; output length dominates chat latency
+CHAT_MAX_TOKENS = 180
+CHAT_RETRY_MAX_TOKENS = 400
+CHAT_STOP = ["\n\nQUESTION:", "\n\nFINDING"]
+
+# Length of the finding text preview returned in chat responses
+CHAT_PREVIEW_CHARS = 200
+
+def build_finding_system_prompt(category: str, summary: str, text_content: str) -> str:
+    """System message for a finding; identical across calls so the prompt prefix can be cached"""
+    return CHAT_SYSTEM_PROMPT.format(category=category, summary=summary, text_content=text_content)
+
+# ---------- Chat Response Cache ----------
+
+# finding_id -> (system message, response context). Findings are only ever
+# inserted (AUTOINCREMENT ids are never reused), so entries never go stale.
+finding_prompt_cache = TTLCache(maxsize=4096, ttl=3600)
+
+# L1: exact (finding, normalized question) -> chat response
+chat_response_cache = TTLCache(maxsize=2000, ttl=3600)
+
+def normalize_question(q: str) -> str:
+    """Lowercase and collapse whitespace so trivially different repeats match"""
+    return re.sub(r"\s+", " ", q.lower().strip())
+
+def chat_cache_key(finding_id: int, normalized_q: str) -> bytes:
+    return hashlib.sha256(f"{finding_id}:{normalized_q}".encode()).digest()
+
+# L2: finding_id -> [(unit question embedding, chat response)], for rephrased questions.
+# Scoped per finding so a semantic hit is always grounded in the same finding.
+semantic_chat_cache = TTLCache(maxsize=2000, ttl=3600)
+SEMANTIC_CACHE_MAX_PER_FINDING = 32
+
+# Questions are embedded with all-MiniLM-L6-v2, not the Jina document model: the
+# 0.92 cosine threshold was chosen for MiniLM, and Jina's scores run higher, so
+# questions differing only in the key term ("flood" vs "fire damage covered?")
+# could clear it and share an answer. Recalibrate if the model changes.
+QUESTION_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+
+def _load_question_embedder():
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(QUESTION_EMBEDDING_MODEL)
+        model = AutoModel.from_pretrained(QUESTION_EMBEDDING_MODEL).eval()
+        logger.info(f"✅ Question embedding model loaded: {QUESTION_EMBEDDING_MODEL}")
+        return tokenizer, model
+    except Exception as e:
+        logger.error(f"❌ Failed to load question embedding model: {e}")
+        return None
+
+def _embed_question_sync(q: str) -> Optional[np.ndarray]:
+    embedder = _get_model("question_embedder", _load_question_embedder)
+    if not embedder:
+        return None
+    tokenizer, model = embedder
+    inputs = tokenizer(q, truncation=True, max_length=256, return_tensors="pt")
+    with torch.inference_mode():
+        # Mean pooling over the tokens, as sentence-transformers does for this model
+        # (a single unpadded question, so every token counts)
+        vector = model(**inputs).last_hidden_state[0].mean(dim=0).numpy().astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+async def embed_question(q: str) -> Optional[np.ndarray]:
+    """Unit-length embedding of a chat question, or None if the model is unavailable"""
+    # The first call loads the model, so keep it off the event loop too
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, _embed_question_sync, q)
+
+def semantic_cache_lookup(finding_id: int, vector: np.ndarray) -> Optional[Dict[str, Any]]:
+    """Cached response for the most similar earlier question on this finding, if close enough"""
+    entries = semantic_chat_cache.get(finding_id)
+    if not entries:
+        return None
+    similarities = np.stack([v for v, _ in entries]) @ vector
+    best = int(np.argmax(similarities))
+    if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+        return entries[best][1]
+    return None
+
+def semantic_cache_store(finding_id: int, vector: np.ndarray, chat_response: Dict[str, Any]):
+    entries = semantic_chat_cache.get(finding_id, [])
+    entries.append((vector, chat_response))
+    semantic_chat_cache[finding_id] = entries[-SEMANTIC_CACHE_MAX_PER_FINDING:]
+
 # ---------- FastAPI App ----------
 
-app = FastAPI(title="Insurance Document Analysis Service", version="3.0.0")
+app = FastAPI(
+    title="Insurance Document Analysis Service",
+    version="3.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -581,6 +940,28 @@ app.add_middleware(
 # Mount static files for PDF serving
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# arq connection pool, set on startup when REDIS_URL is configured
+arq_pool = None
+
+@app.on_event("startup")
+async def connect_task_queue():
+    """Connect to the arq task queue if REDIS_URL is set"""
+    global arq_pool
+    if not REDIS_URL:
+        return
+    try:
+        from arq import create_pool
+        from arq.connections import RedisSettings
+        arq_pool = await create_pool(RedisSettings.from_dsn(REDIS_URL))
+        logger.info("✅ Connected to arq task queue")
+    except Exception as e:
+        logger.warning(f"❌ Could not connect to arq task queue, using background tasks: {e}")
+
+@app.on_event("shutdown")
+async def close_task_queue():
+    if arq_pool:
+        await arq_pool.close()
+
 # ---------- Pydantic Models ----------
 
 class ChunkModel(BaseModel):
@@ -629,39 +1010,23 @@ async def root():
 async def ingest(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     try:
         logger.info(f"📤 [Ingest] Processing file: {file.filename} ({file.size} bytes)")
-        data = await file.read()
-        if not data:
+        # Save the PDF file, hashing it while it streams to disk
+        file_hash, pdf_path, size = await save_upload(file)
+        if not size:
             logger.error(f"❌ [Ingest] Empty file received: {file.filename}")
             raise HTTPException(400, "Empty file")
         
-        logger.info(f"📤 [Ingest] File read successfully: {len(data)} bytes")
-        file_hash = await compute_hash(data)
-        
-        # Save the PDF file
-        pdf_path = UPLOADS_DIR / f"{file_hash}.pdf"
-        with open(pdf_path, "wb") as f:
-            f.write(data)
+        logger.info(f"📤 [Ingest] File saved successfully: {size} bytes")
         
         # Extract text with coordinates
         logger.info(f"📄 [Ingest] Starting text extraction with coordinates...")
-        text_blocks = await extract_text_with_coordinates(data)
+        text_blocks = await extract_text_with_coordinates(pdf_path)
         logger.info(f"📄 [Ingest] Extracted {len(text_blocks)} text blocks")
         
-        # Also extract plain text for compatibility
-        logger.info(f"📄 [Ingest] Starting plain text extraction...")
-        text = await extract_text(data)
-        logger.info(f"📄 [Ingest] Extracted {len(text)} characters of plain text")
-        
-        # Cache both
-        logger.info(f"💾 [Ingest] Caching extracted data...")
-        db = get_db()
-        db.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', 
-                  (f"text:{file_hash}", text))
-        db.execute('INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)', 
-                  (f"blocks:{file_hash}", json.dumps(text_blocks)))
-        db.commit()
-        db.close()
-        logger.info(f"💾 [Ingest] Data cached successfully")
+        # Save the blocks for the background analysis, keeping large payloads out of SQLite
+        logger.info(f"💾 [Ingest] Saving extracted data...")
+        get_blocks_path(file_hash).write_bytes(orjson.dumps(text_blocks))
+        logger.info(f"💾 [Ingest] Data saved successfully")
         
         # Create chunks
         logger.info(f"✂️ [Ingest] Starting chunk creation...")
@@ -675,8 +1040,15 @@ async def ingest(background_tasks: BackgroundTasks, file: UploadFile = File(...)
         
         # Start background analysis
         logger.info(f"🔄 [Ingest] Starting background analysis task...")
-        background_tasks.add_task(analyze_document_background, file_hash)
-        logger.info(f"🔄 [Ingest] Background analysis task queued")
+        if arq_pool:
+            # Fixed job id: re-uploading the same PDF while its job is queued or
+            # running doesn't queue a second analysis. The worker keeps no job
+            # results, so once it has finished a re-upload is analyzed again.
+            job = await arq_pool.enqueue_job('analyze_document', file_hash, _job_id=f"analyze:{file_hash}")
+            logger.info(f"🔄 [Ingest] Background analysis job queued: {job.job_id if job else 'already queued'}")
+        else:
+            background_tasks.add_task(analyze_document_background, file_hash)
+            logger.info(f"🔄 [Ingest] Background analysis task queued")
         
         # Use ChromaDB for vector storage
         logger.info(f"🔍 [Ingest] Setting up vector store...")
@@ -686,7 +1058,16 @@ async def ingest(background_tasks: BackgroundTasks, file: UploadFile = File(...)
             ids = [f"chunk_{i}" for i in range(len(chunks))]  # Generate unique IDs
             
             logger.info(f"🔍 [Ingest] Adding {len(texts)} chunks to vector store...")
-            vs.add_texts(texts=texts, ids=ids)
+            if texts:
+                # Embed once in batches off the event loop, then hand Chroma the vectors
+                loop = asyncio.get_event_loop()
+                vectors = await loop.run_in_executor(None, vs.embeddings.embed_documents, texts)
+                vs._collection.upsert(
+                    ids=ids,
+                    documents=texts,
+                    embeddings=vectors,
+                    metadatas=[{"page_num": c['page_num']} for c in chunks]
+                )
             logger.info(f"✅ [Ingest] Successfully added chunks to vector store")
         except Exception as e:
             logger.warning(f"⚠️ [Ingest] Vector store error: {e}")
@@ -763,14 +1144,11 @@ async def ingest(background_tasks: BackgroundTasks, file: UploadFile = File(...)
 @app.get("/analysis/{document_id}", response_model=AnalysisStatus)
 async def get_analysis_status(document_id: str):
     """Get analysis status and findings count"""
-    db = get_db()
-    cursor = db.execute('''
+    result = await db_fetchone('''
         SELECT analysis_status, 
                (SELECT COUNT(*) FROM findings WHERE document_id = ?) as findings_count
         FROM documents WHERE id = ?
     ''', (document_id, document_id))
-    result = cursor.fetchone()
-    db.close()
     
     if not result:
         raise HTTPException(404, "Document not found")
@@ -784,41 +1162,35 @@ async def get_analysis_status(document_id: str):
 @app.get("/findings/{document_id}", response_model=List[Finding])
 async def get_findings(document_id: str):
     """Get all findings for a document with deduplication"""
-    db = get_db()
-    cursor = db.execute('''
-        SELECT id, category, severity, summary, recommendation, page_num, confidence_score
+    # One row per summary; SQLite takes the bare columns from the MAX() row
+    rows = await db_fetchall('''
+        SELECT id, category, severity, summary, recommendation, page_num,
+               MAX(confidence_score) AS confidence_score
         FROM findings 
         WHERE document_id = ?
+        GROUP BY summary
         ORDER BY severity DESC, confidence_score DESC
     ''', (document_id,))
     
     findings = []
-    seen_summaries = set()  # duplicate nahi chahiye bro
-    
-    for row in cursor.fetchall():
-        summary = row[3]
-        # Only add if we haven't seen this summary before
-        if summary not in seen_summaries:
-            findings.append(Finding(
-                id=row[0],
-                category=row[1],
-                severity=row[2],
-                summary=summary,
-                recommendation=row[4],
-                page_num=row[5],
-                confidence_score=row[6]
-            ))
-            seen_summaries.add(summary)
+    for row in rows:
+        findings.append(Finding(
+            id=row[0],
+            category=row[1],
+            severity=row[2],
+            summary=row[3],
+            recommendation=row[4],
+            page_num=row[5],
+            confidence_score=row[6]
+        ))
     
-    db.close()
     logger.info(f"✅ [Findings] Returned {len(findings)} unique findings for document {document_id}")
     return findings
 
 @app.get("/findings/{document_id}/category/{category}")
 async def get_findings_by_category(document_id: str, category: str):
     """Get findings filtered by category"""
-    db = get_db()
-    cursor = db.execute('''
+    rows = await db_fetchall('''
         SELECT id, category, severity, summary, recommendation, page_num, confidence_score
         FROM findings 
         WHERE document_id = ? AND category = ?
@@ -826,7 +1198,7 @@ async def get_findings_by_category(document_id: str, category: str):
     ''', (document_id, category))
     
     findings = []
-    for row in cursor.fetchall():
+    for row in rows:
         findings.append(Finding(
             id=row[0],
             category=row[1],
@@ -837,9 +1209,93 @@ async def get_findings_by_category(document_id: str, category: str):
             confidence_score=row[6]
         ))
     
-    db.close()
     return findings
 
+async def lookup_chat_cache(finding_id: int, q: str) -> Tuple[Optional[Dict[str, Any]], bytes, Optional[np.ndarray]]:
+    """Check the exact then semantic chat caches; returns (cached response, cache key, question embedding)"""
+    # Answers are near-deterministic at temperature 0.1, so repeats are served from cache
+    cache_key = chat_cache_key(finding_id, normalize_question(q))
+    cached = chat_response_cache.get(cache_key)
+    if cached:
+        logger.debug(f"💬 [Contextual Chat] Cache hit for finding {finding_id}")
+        return cached, cache_key, None
+    
+    # Then look for a near-duplicate question on the same finding. With nothing to
+    # compare against, skip the embedding pass; it is done after answering instead.
+    if finding_id not in semantic_chat_cache:
+        return None, cache_key, None
+    try:
+        question_vector = await embed_question(q)
+    except Exception as e:
+        logger.warning(f"⚠️ [Contextual Chat] Could not embed question: {e}")
+        question_vector = None
+    if question_vector is not None:
+        cached = semantic_cache_lookup(finding_id, question_vector)
+        if cached:
+            logger.debug(f"💬 [Contextual Chat] Semantic cache hit for finding {finding_id}")
+            chat_response_cache[cache_key] = cached
+            return cached, cache_key, question_vector
+    
+    return None, cache_key, question_vector
+
+# Keep references to question embeddings still being computed for the semantic cache
+_semantic_store_tasks = set()
+
+def store_chat_response(finding_id: int, cache_key: bytes, q: str, question_vector: Optional[np.ndarray],
+                        chat_response: Dict[str, Any]):
+    """Cache a new answer; if the lookup didn't embed the question, that happens in the background"""
+    chat_response_cache[cache_key] = chat_response
+    if question_vector is not None:
+        semantic_cache_store(finding_id, question_vector, chat_response)
+        return
+    task = asyncio.ensure_future(_embed_and_store(finding_id, q, chat_response))
+    _semantic_store_tasks.add(task)
+    task.add_done_callback(_semantic_store_tasks.discard)
+
+async def _embed_and_store(finding_id: int, q: str, chat_response: Dict[str, Any]):
+    try:
+        question_vector = await embed_question(q)
+    except Exception as e:
+        logger.warning(f"⚠️ [Contextual Chat] Could not embed question: {e}")
+        return
+    if question_vector is not None:
+        semantic_cache_store(finding_id, question_vector, chat_response)
+
+async def load_finding_for_chat(finding_id: int) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Get the system message and response context for a finding (404 if missing)"""
+    cached = finding_prompt_cache.get(finding_id)
+    if cached:
+        return cached
+    
+    result = await db_fetchone('''
+        SELECT text_content, category, summary, document_id
+        FROM findings WHERE id = ? LIMIT 1
+    ''', (finding_id,))
+    
+    if not result:
+        raise HTTPException(404, "Finding not found")
+    
+    text_content, category, summary, document_id = result
+    
+    # Stable system prefix per finding, question last, so provider prefix caching can reuse it
+    system_message = {"role": "system", "content": build_finding_system_prompt(category, summary, text_content)}
+    # The preview is computed once here and served from finding_prompt_cache afterwards
+    preview = text_content if len(text_content) <= CHAT_PREVIEW_CHARS else text_content[:CHAT_PREVIEW_CHARS] + "..."
+    context = {
+        'category': category,
+        'summary': summary,
+        'text_content': preview
+    }
+    finding_prompt_cache[finding_id] = (system_message, context)
+    return system_message, context
+
+def sse_event(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+# Single-flight: chat cache key -> future of the in-progress answer, so concurrent
+# identical questions share one upstream call
+chat_inflight: Dict[bytes, asyncio.Future] = {}
+
 @app.post("/findings/{finding_id}/chat")
 async def contextual_chat(finding_id: int, question: Dict[str, str]):
     """Chat about specific finding with context"""
@@ -847,71 +1303,219 @@ async def contextual_chat(finding_id: int, question: Dict[str, str]):
     if not q:
         raise HTTPException(400, "Missing query")
     
-    # Get finding details
-    db = get_db()
-    cursor = db.execute('''
-        SELECT text_content, category, summary, document_id
-        FROM findings WHERE id = ?
-    ''', (finding_id,))
-    result = cursor.fetchone()
-    db.close()
+    cache_key = chat_cache_key(finding_id, normalize_question(q))
+    leader = chat_inflight.get(cache_key)
+    if leader:
+        logger.debug(f"💬 [Contextual Chat] Joining in-flight request for finding {finding_id}")
+        return await asyncio.shield(leader)
     
-    if not result:
-        raise HTTPException(404, "Finding not found")
+    future = asyncio.get_event_loop().create_future()
+    # Retrieve the exception even when nobody joined, to avoid "never retrieved" warnings
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    chat_inflight[cache_key] = future
+    try:
+        chat_response = await answer_finding_question(finding_id, q)
+        future.set_result(chat_response)
+        return chat_response
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        del chat_inflight[cache_key]
+
+async def answer_finding_question(finding_id: int, q: str) -> Dict[str, Any]:
+    """Answer a question about a finding from cache or the LLM"""
+    cached, cache_key, question_vector = await lookup_chat_cache(finding_id, q)
+    if cached:
+        return cached
     
-    text_content, category, summary, document_id = result
+    # Get finding details
+    system_message, context = await load_finding_for_chat(finding_id)
     
     # Use LLM for contextual answer
-    llm = get_llm()
-    if not llm:
+    create_chat = get_create_chat()
+    if not create_chat:
         raise HTTPException(500, "LLM not available")
     
     try:
-        context_prompt = f"""
-You are an expert insurance consultant. Answer the question based on this specific finding:
-
-FINDING DETAILS:
-- Category: {category}
-- Summary: {summary}
-- Text: {text_content}
-
-QUESTION: {q}
-
-Provide a focused answer based only on this finding's context.
-"""
-        
-        messages = [{"role": "user", "content": context_prompt}]
-        
-        response = llm.chat.completions.create(
+        # Groq client is sync - run it off the event loop
+        loop = asyncio.get_event_loop()
+        messages = [system_message, {"role": "user", "content": q}]
+        response = await loop.run_in_executor(CHAT_EXECUTOR, partial(
+            create_chat,
             messages=messages,
-            model="llama-3.3-70b-versatile",
-            temperature=0.1,
-            max_tokens=400
-        )
+            max_tokens=CHAT_MAX_TOKENS,
+            stop=CHAT_STOP
+        ))
+        
+        # Rare long answers: ask again once with the larger budget instead of returning a cut-off answer
+        if response.choices[0].finish_reason == "length":
+            logger.debug(f"💬 [Contextual Chat] Answer hit {CHAT_MAX_TOKENS} tokens, retrying with {CHAT_RETRY_MAX_TOKENS}")
+            response = await loop.run_in_executor(CHAT_EXECUTOR, partial(
+                create_chat,
+                messages=messages,
+                max_tokens=CHAT_RETRY_MAX_TOKENS,
+                stop=CHAT_STOP
+            ))
         
         answer = response.choices[0].message.content.strip()
         
-        return {
+        chat_response = {
             'answer': answer,
             'finding_id': finding_id,
-            'context': {
-                'category': category,
-                'summary': summary,
-                'text_content': text_content[:200] + "..." if len(text_content) > 200 else text_content
-            }
+            'context': context
         }
+        store_chat_response(finding_id, cache_key, q, question_vector, chat_response)
+        return chat_response
         
     except Exception as e:
         logger.error(f"❌ [Contextual Chat] Error: {e}")
         raise HTTPException(500, f"Chat failed: {str(e)}")
 
+@app.post("/findings/{finding_id}/chat/stream")
+async def contextual_chat_stream(finding_id: int, question: Dict[str, str]):
+    """
+    Chat about specific finding, streamed as server-sent events:
+    {"delta": ...} per token chunk, then {"done": true, "context": ...}
+    """
+    q = question.get('q') or question.get('question')
+    if not q:
+        raise HTTPException(400, "Missing query")
+    
+    cached, cache_key, question_vector = await lookup_chat_cache(finding_id, q)
+    if cached:
+        def cached_events():
+            yield sse_event({"delta": cached['answer']})
+            yield sse_event({"done": True, "context": cached['context']})
+        return StreamingResponse(cached_events(), media_type="text/event-stream")
+    
+    system_message, context = await load_finding_for_chat(finding_id)
+    
+    create_chat = get_create_chat()
+    if not create_chat:
+        raise HTTPException(500, "LLM not available")
+    
+    try:
+        loop = asyncio.get_event_loop()
+        stream = await loop.run_in_executor(CHAT_EXECUTOR, partial(
+            create_chat,
+            messages=[system_message, {"role": "user", "content": q}],
+            # Streamed tokens are shown as they arrive, so keep the larger budget
+            max_tokens=CHAT_RETRY_MAX_TOKENS,
+            stop=CHAT_STOP,
+            stream=True
+        ))
+    except Exception as e:
+        logger.error(f"❌ [Contextual Chat] Error: {e}")
+        raise HTTPException(500, f"Chat failed: {str(e)}")
+    
+    # Sync generator: Starlette iterates it in a worker thread, so the blocking
+    # Groq stream never runs on the event loop
+    def events():
+        parts = []
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+        except Exception as e:
+            logger.error(f"❌ [Contextual Chat] Stream error: {e}")
+            yield sse_event({"error": f"Chat failed: {str(e)}"})
+            return
+        finally:
+            # Also runs when the client disconnects and the generator is closed,
+            # returning the connection to the shared Groq HTTP pool right away
+            stream.close()
+        
+        chat_response = {
+            'answer': "".join(parts).strip(),
+            'finding_id': finding_id,
+            'context': context
+        }
+        # The caches are only touched from the event loop thread
+        loop.call_soon_threadsafe(store_chat_response, finding_id, cache_key, q, question_vector, chat_response)
+        yield sse_event({"done": True, "context": context})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse that hands the file to the server via the ASGI
+    http.response.zerocopysend extension (sendfile) when the server offers it,
+    and falls back to FileResponse's chunked reads otherwise
+    """
+    async def __call__(self, scope, receive, send):
+        # Range requests need Starlette's partial-content handling, which only the parent implements
+        if (
+            "http.response.zerocopysend" not in scope.get("extensions", {})
+            or scope["method"].upper() == "HEAD"
+            or any(name == b"range" for name, _ in scope["headers"])
+        ):
+            await super().__call__(scope, receive, send)
+            return
+        
+        if self.stat_result is None:
+            loop = asyncio.get_event_loop()
+            self.stat_result = await loop.run_in_executor(None, os.stat, self.path)
+            self.set_stat_headers(self.stat_result)
+        
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        with open(self.path, "rb") as f:
+            await send({"type": "http.response.zerocopysend", "file": f, "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+# Strong ETag per served PDF; uploads are stored by content hash and never rewritten
+pdf_etags: Dict[str, str] = {}
+PDF_CACHE_CONTROL = "private, max-age=3600"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check: '*' or any listed tag, using weak comparison (RFC 7232 3.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(","))
+
 @app.get("/documents/{document_id}/pdf")
-async def get_pdf(document_id: str):
+async def get_pdf(document_id: str, request: Request):
     """Serve PDF file"""
+    # Revalidation of a PDF we've already tagged needs no disk access
+    if_none_match = request.headers.get("if-none-match")
+    etag = pdf_etags.get(document_id)
+    if etag and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": PDF_CACHE_CONTROL})
+    
     pdf_path = UPLOADS_DIR / f"{document_id}.pdf"
     if not pdf_path.exists():
+        pdf_etags.pop(document_id, None)
         raise HTTPException(404, "PDF not found")
-    return FileResponse(pdf_path, media_type="application/pdf")
+    
+    stat_result = pdf_path.stat()
+    etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+    pdf_etags[document_id] = etag
+    headers = {"ETag": etag, "Cache-Control": PDF_CACHE_CONTROL}
+    
+    # If-None-Match takes precedence over If-Modified-Since when both are sent
+    if if_none_match:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        if_modified_since = None
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            if int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp():
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass  # Malformed header, serve the file
+    
+    return ZeroCopyFileResponse(pdf_path, media_type="application/pdf", stat_result=stat_result, headers=headers)
 
 @app.get("/test/chunking")
 async def test_chunking():
@@ -949,21 +1553,48 @@ async def test_chunking():
             "error_type": type(e).__name__
         }
 
+# Static body for load-balancer probes; the timestamp is only added on request
+HEALTH_BODY = orjson.dumps({"status": "healthy"})
+
 @app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+async def health_check(ts: int = 0):
+    """Health check endpoint (pass ?ts=1 to include a timestamp)"""
+    if ts:
+        return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return Response(content=HEALTH_BODY, media_type="application/json")
+
+# Map status to progress percentage
+PROGRESS_MAP = {
+    "pending": 10,
+    "analyzing": 75,
+    "completed": 100,
+    "failed": 0
+}
 
-@app.get("/progress/{document_id}")
-async def get_processing_progress(document_id: str):
-    """Get real-time processing progress for a document"""
+PROGRESS_MESSAGE_MAP = {
+    "pending": "Document uploaded, waiting for analysis to start",
+    "analyzing": "AI is analyzing document for insurance concerns",
+    "completed": "Analysis completed successfully",
+    "failed": "Analysis failed, please try again"
+}
+
+# Statuses after which the progress no longer changes
+PROGRESS_FINAL_STATUSES = {"completed", "failed", "not_found", "error"}
+PROGRESS_LONG_POLL_TIMEOUT = 25
+# With the arq worker, status changes happen in another process and can't wake us
+PROGRESS_REMOTE_POLL_INTERVAL = 2
+
+def progress_wait_timeout() -> float:
+    """How long to wait for a progress event before re-reading the status"""
+    return PROGRESS_REMOTE_POLL_INTERVAL if arq_pool else PROGRESS_LONG_POLL_TIMEOUT
+
+async def build_progress_response(document_id: str) -> Dict[str, Any]:
+    """Current progress payload for a document"""
     try:
         logger.debug(f"📊 [Progress] Getting progress for document: {document_id}")
         
-        db = get_db()
-        cursor = db.execute('SELECT analysis_status FROM documents WHERE id = ?', (document_id,))
-        result = cursor.fetchone()
-        db.close()
+        # documents.id is the primary key, so this is a single index seek
+        result = await db_fetchone('SELECT analysis_status FROM documents WHERE id = ? LIMIT 1', (document_id,))
         
         if not result:
             logger.warning(f"⚠️ [Progress] Document not found: {document_id}")
@@ -972,30 +1603,10 @@ async def get_processing_progress(document_id: str):
         status = result[0]
         logger.debug(f"📊 [Progress] Document status: {status}")
         
-        # Map status to progress percentage
-        progress_map = {
-            "pending": 10,
-            "analyzing": 75,
-            "completed": 100,
-            "failed": 0
-        }
-        
-        progress = progress_map.get(status, 0)
-        
-        # Get additional context
-        message_map = {
-            "pending": "Document uploaded, waiting for analysis to start",
-            "analyzing": "AI is analyzing document for insurance concerns",
-            "completed": "Analysis completed successfully",
-            "failed": "Analysis failed, please try again"
-        }
-        
-        message = message_map.get(status, "Unknown status")
-        
         response = {
             "status": status,
-            "progress": progress,
-            "message": message,
+            "progress": PROGRESS_MAP.get(status, 0),
+            "message": PROGRESS_MESSAGE_MAP.get(status, "Unknown status"),
             "timestamp": datetime.now().isoformat()
         }
         
@@ -1006,6 +1617,64 @@ async def get_processing_progress(document_id: str):
         logger.error(f"❌ [Progress] Error getting progress: {e}")
         return {"status": "error", "progress": 0, "message": "Error getting progress"}
 
+@app.get("/progress/{document_id}")
+async def get_processing_progress(document_id: str, since: Optional[str] = None):
+    """
+    Get real-time processing progress for a document.
+    With ?since=<status>, long-polls: waits up to PROGRESS_LONG_POLL_TIMEOUT
+    seconds for the status to move on from <status> before responding.
+    """
+    if not since:
+        return await build_progress_response(document_id)
+    
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + PROGRESS_LONG_POLL_TIMEOUT
+    with watching_progress(document_id):
+        while True:
+            # Register before reading so a change in between isn't missed
+            event = progress_event(document_id)
+            response = await build_progress_response(document_id)
+            remaining = deadline - loop.time()
+            if response["status"] != since or since in PROGRESS_FINAL_STATUSES or remaining <= 0:
+                return response
+            await wait_for_progress(event, min(remaining, progress_wait_timeout()))
+
+async def wait_for_disconnect(websocket: WebSocket):
+    """Return once the client disconnects (anything it sends is ignored)"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@app.websocket("/progress/ws/{document_id}")
+async def progress_websocket(websocket: WebSocket, document_id: str):
+    """Push the progress payload on every status change until analysis finishes"""
+    await websocket.accept()
+    # Unchanged statuses aren't re-sent, so a failed send can't be relied on to notice the client leaving
+    disconnected = asyncio.ensure_future(wait_for_disconnect(websocket))
+    last_status = None
+    try:
+        with watching_progress(document_id):
+            while not disconnected.done():
+                event = progress_event(document_id)
+                response = await build_progress_response(document_id)
+                if response["status"] != last_status:
+                    await websocket.send_json(response)
+                    last_status = response["status"]
+                if last_status in PROGRESS_FINAL_STATUSES:
+                    break
+                # On timeout, re-read anyway (status may be written by another process)
+                changed = asyncio.ensure_future(event.wait())
+                await asyncio.wait({changed, disconnected}, timeout=progress_wait_timeout(),
+                                   return_when=asyncio.FIRST_COMPLETED)
+                changed.cancel()
+        if disconnected.done():
+            logger.debug(f"📊 [Progress] WebSocket closed for document: {document_id}")
+        else:
+            await websocket.close()
+    except WebSocketDisconnect:
+        logger.debug(f"📊 [Progress] WebSocket closed for document: {document_id}")
+    finally:
+        disconnected.cancel()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""
+PDF text extraction run in EXTRACT_POOL worker processes.
+
+Spawned workers import this module to unpickle the functions they run, so it
+must only depend on fitz - importing app.py here would load torch, the
+embedding model setup and the database in every worker.
+"""
+from pathlib import Path
+from typing import List, Dict, Any
+
+import fitz
+
+
+def count_pages(pdf_path: Path) -> int:
+    """Get the number of pages in a PDF"""
+    with fitz.open(str(pdf_path)) as doc:
+        return doc.page_count
+
+
+def extract_page_range(pdf_path: Path, start: int, end: int) -> List[Dict[str, Any]]:
+    """Synchronous text extraction with coordinates for pages [start, end)"""
+    doc = fitz.open(str(pdf_path))
+    text_blocks = []
+
+    for page_index in range(start, end):
+        page = doc[page_index]
+        page_num = page_index + 1  # 1-indexed
+
+        # Flat (x0, y0, x1, y1, text, block_no, block_type) tuples; type 0 is text
+        text_blocks.extend([
+            {
+                "text": text,
+                "page_num": page_num,
+                "coordinates": [x0, y0, x1, y1],
+                "block_id": f"page_{page_num}_block_{block_no}"
+            }
+            for x0, y0, x1, y1, raw_text, block_no, block_type in page.get_text("blocks")
+            if block_type == 0 and (text := raw_text.strip())
+        ])
+
+    doc.close()
+    return text_blocks
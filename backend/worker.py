@@ -0,0 +1,34 @@
+"""
+arq worker for background document analysis.
+
+Set REDIS_URL for both the API server and the worker, then start it from the
+backend directory with:
+
+    arq worker.WorkerSettings
+"""
+import os
+
+from arq.connections import RedisSettings
+
+try:
+    from app import analyze_document_background
+except ModuleNotFoundError as e:  # started from the repository root
+    if e.name != "app":
+        raise
+    from backend.app import analyze_document_background
+
+
+async def analyze_document(ctx, document_id: str):
+    """Run the concern analysis for an ingested document"""
+    await analyze_document_background(document_id)
+
+
+class WorkerSettings:
+    functions = [analyze_document]
+    redis_settings = RedisSettings.from_dsn(os.getenv("REDIS_URL", "redis://localhost:6379"))
+    # Long documents make many LLM calls
+    job_timeout = 3600
+    # A kept result would block re-enqueueing the same analysis:<hash> job id,
+    # leaving a re-uploaded document 'pending' with nothing to run it
+    keep_result = 0
+    max_jobs = 4